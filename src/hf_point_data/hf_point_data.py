@@ -1,23 +1,270 @@
 """Module to retrieve point observations."""
 # pylint: disable=C0301
 import datetime
+import functools
 from typing import Tuple
-import io
+import hashlib
 import ast
+import io
 import os
 import json
 import sqlite3
+import tempfile
+import threading
+import time
+import warnings
+import urllib.parse
 import datetime as dt
 import pandas as pd
 import xarray as xr
 import numpy as np
 import requests
+import urllib3
+from urllib3.util.retry import Retry
+
+__all__ = ["get_data", "get_metadata", "get_citations", "get_registered_api_pin"]
 
 HYDRODATA = "/hydrodata"
 DB_PATH = f"{HYDRODATA}/national_obs/point_obs.sqlite"
 HYDRODATA_URL = os.getenv("HYDRODATA_URL", "https://hydro-dev-aj.princeton.edu")
 NETWORK_LISTS_PATH = f"/{HYDRODATA}/national_obs/tools/network_lists"
 
+# Citation statements printed by get_citations for each data source
+_CITATIONS = {
+    "usgs_nwis": """\
+Most U.S. Geological Survey (USGS) information resides in Public Domain
+and may be used without restriction, though they do ask that proper credit be given.
+An example credit statement would be: "(Product or data name) courtesy of the U.S. Geological Survey"
+Source: https://www.usgs.gov/information-policies-and-instructions/acknowledging-or-crediting-usgs""",
+    "usda_nrcs": """\
+Most information presented on the USDA Web site is considered public domain information.
+Public domain information may be freely distributed or copied, but use of appropriate
+byline/photo/image credits is requested.
+Attribution may be cited as follows: "U.S. Department of Agriculture"
+Source: https://www.usda.gov/policies-and-links""",
+    "ameriflux": """\
+All AmeriFlux sites provided by the HydroData service follow the CC-BY-4.0 License.
+The CC-BY-4.0 license specifies that the data user is free to Share (copy and redistribute
+the material in any medium or format) and/or Adapt (remix, transform, and build upon the
+material) for any purpose.
+
+Users of this data must acknowledge the AmeriFlux data resource with the following statement:
+"Funding for the AmeriFlux data portal was provided by the U.S. Department of Energy Office
+of Science."
+
+Additionally, for each AmeriFlux site used, you must provide a citation to the site's
+data product that includes the data product DOI. The DOI for each site is included in the
+full metadata query. Alternately, a site list can be provided to this get_citation_information
+function to return each site-specific DOI.
+
+Source: https://ameriflux.lbl.gov/data/data-policy/""",
+}
+
+# Location of the NetCDF observation files on /hydrodata for each var_id
+_DIRPATHS = {1: '/hydrodata/national_obs/streamflow/data/hourly',
+             2: '/hydrodata/national_obs/streamflow/data/daily',
+             3: '/hydrodata/national_obs/groundwater/data/hourly',
+             4: '/hydrodata/national_obs/groundwater/data/daily',
+             5: '',
+             6: '/hydrodata/national_obs/swe/data/daily',
+             7: '/hydrodata/national_obs/point_meteorology/NRCS_precipitation/data/daily',
+             8: '/hydrodata/national_obs/point_meteorology/NRCS_precipitation/data/daily',
+             9: '/hydrodata/national_obs/point_meteorology/NRCS_precipitation/data/daily',
+             10: '/hydrodata/national_obs/point_meteorology/NRCS_temperature/data/daily',
+             11: '/hydrodata/national_obs/point_meteorology/NRCS_temperature/data/daily',
+             12: '/hydrodata/national_obs/point_meteorology/NRCS_temperature/data/daily',
+             13: '/hydrodata/national_obs/soil_moisture/data/daily',
+             14: '/hydrodata/national_obs/soil_moisture/data/daily',
+             15: '/hydrodata/national_obs/soil_moisture/data/daily',
+             16: '/hydrodata/national_obs/soil_moisture/data/daily',
+             17: '/hydrodata/national_obs/soil_moisture/data/daily',
+             18: '/hydrodata/national_obs/ameriflux/data/hourly',
+             19: '/hydrodata/national_obs/ameriflux/data/hourly',
+             20: '/hydrodata/national_obs/ameriflux/data/hourly',
+             21: '/hydrodata/national_obs/ameriflux/data/hourly',
+             22: '/hydrodata/national_obs/ameriflux/data/hourly',
+             23: '/hydrodata/national_obs/ameriflux/data/hourly',
+             24: '/hydrodata/national_obs/ameriflux/data/hourly'}
+
+# Allowed values checked by _check_inputs. These are explicit membership tests
+# rather than asserts so that validation still runs under `python -O`.
+_DATA_SOURCES = frozenset({'usgs_nwis', 'usda_nrcs', 'ameriflux'})
+_VARIABLES = frozenset({'streamflow', 'wtd', 'swe', 'precipitation', 'temperature', 'soil moisture',
+                        'latent heat flux', 'sensible heat flux', 'shortwave radiation', 'longwave radiation',
+                        'vapor pressure deficit', 'wind speed'})
+_TEMPORAL_RESOLUTIONS = frozenset({'daily', 'hourly', 'instantaneous'})
+_AGGREGATIONS = frozenset({'average', 'instantaneous', 'total', 'total, snow-adjusted',
+                           'start-of-day', 'accumulated', 'minimum', 'maximum'})
+_DEPTH_LEVELS = frozenset({2, 4, 8, 20, 40})
+
+# Name of the observation variable in the site NetCDF files for each var_id
+_VARNAMES = {1: 'streamflow', 2: 'streamflow', 3: 'wtd', 4: 'wtd', 5: 'wtd',
+             6: 'swe', 7: 'precip_acc', 8: 'precip_inc', 9: 'precip_inc_sa',
+             10: 'temp_min', 11: 'temp_max', 12: 'temp_avg',
+             13: 'sms_2in', 14: 'sms_4in', 15: 'sms_8in', 16: 'sms_20in', 17: 'sms_40in',
+             18: 'latent heat flux', 19: 'sensible heat flux', 20: 'shortwave radiation',
+             21: 'longwave radiation', 22: 'vapor pressure deficit', 23: 'air temperature',
+             24: 'wind speed'}
+
+# Site networks with a network list .csv file, by data source and variable
+_NETWORK_OPTIONS = {'usgs_nwis': {'streamflow': ['camels', 'gagesii_reference', 'gagesii', 'hcdn2009'],
+                                  'wtd': ['climate_response_network']}}
+
+# Site attribute metadata columns returned by _get_sites
+_SITE_COLUMNS = [
+    "s.site_id", "s.site_name", "s.site_type", "s.agency", "s.state",
+    "s.latitude", "s.longitude", "s.huc", "o.first_date_data_available",
+    "o.last_date_data_available", "o.record_count", "s.site_query_url",
+    "s.date_metadata_last_updated", "s.tz_cd", "s.doi",
+]
+
+# Optional filters applied by _get_sites, in query order: the option name, the SQL
+# clause it adds and a function mapping the option value to the clause parameters.
+# The overall record count is an upper bound on the number of observations within
+# any date range, so sites below min_num_obs can be dropped before any observation
+# data is read. Lists of sites are bound as a single JSON array parameter so the
+# query text does not depend on the number of sites.
+_SITE_FILTERS = (
+    ("date_start", """ AND last_date_data_available >= ?""", lambda v: (v,)),
+    ("date_end", """ AND first_date_data_available <= ?""", lambda v: (v,)),
+    ("min_num_obs", """ AND record_count >= ?""", lambda v: (v,)),
+    ("latitude_range", """ AND latitude BETWEEN ? AND ?""", lambda v: v[:2]),
+    ("longitude_range", """ AND longitude BETWEEN ? AND ?""", lambda v: v[:2]),
+    ("site_ids", """ AND s.site_id IN (SELECT value FROM json_each(?))""", lambda v: (_json_site_list(v),)),
+    ("state", """ AND state == ?""", lambda v: (v,)),
+)
+
+# Variable IDs whose observations are stored as per-site NetCDF files; variable 5
+# (instantaneous water table depth) is read from the wtd_discrete_data table
+_NC_VAR_IDS = frozenset({1, 2, 3, 4, *range(6, 25)})
+
+# Attribute table holding the additional metadata for each site type
+_SITE_TYPE_ATTRIBUTES = {
+    "stream gauge": "streamgauge_attributes",
+    "groundwater well": "well_attributes",
+    "SNOTEL station": "snotel_station_attributes",
+    "SCAN station": "snotel_station_attributes",
+    "flux tower": "flux_tower_attributes",
+}
+
+# Queries for the attribute tables, in the order they are merged onto the site metadata
+_ATTRIBUTE_QUERIES = {
+    "streamgauge_attributes": """
+        SELECT site_id, conus1_x, conus1_y, conus2_x, conus2_y,
+               gages_drainage_sqkm AS gagesii_drainage_area,
+               class AS gagesii_class,
+               site_elevation_meters AS gagesii_site_elevation,
+               drain_area_va AS usgs_drainage_area
+        FROM streamgauge_attributes INNER JOIN _site_filter USING (site_id)
+        """,
+    "well_attributes": """
+        SELECT site_id, conus1_x, conus1_y, conus2_x, conus2_y,
+               nat_aqfr_cd AS usgs_nat_aqfr_cd,
+               aqfr_cd AS usgs_aqfr_cd,
+               aqfr_type_cd AS usgs_aqfr_type_cd,
+               well_depth_va AS usgs_well_depth,
+               hole_depth_va AS usgs_hole_depth,
+               depth_src_cd AS usgs_hole_depth_src_cd
+        FROM well_attributes INNER JOIN _site_filter USING (site_id)
+        """,
+    "snotel_station_attributes": """
+        SELECT site_id, conus1_x, conus1_y, conus2_x, conus2_y,
+               elevation AS usda_elevation
+        FROM snotel_station_attributes INNER JOIN _site_filter USING (site_id)
+        """,
+    "flux_tower_attributes": """
+        SELECT site_id, conus1_x, conus1_y, conus2_x, conus2_y,
+               site_description AS ameriflux_site_description,
+               elevation AS ameriflux_elevation,
+               tower_type AS ameriflux_tower_type,
+               igbp AS ameriflux_igbp,
+               terrain AS ameriflux_terrain,
+               site_snow_cover_days AS ameriflux_site_snow_cover_days,
+               climate_koeppen AS ameriflux_climate_koeppen,
+               mean_annual_temp AS ameriflux_mean_annual_temp,
+               mean_annual_precip AS ameriflux_mean_annual_precip,
+               team_member_name AS ameriflux_team_member_name,
+               team_member_role AS ameriflux_team_member_role,
+               team_member_email AS ameriflux_team_member_email,
+               team_member_institution AS ameriflux_team_member_institution,
+               site_funding AS ameriflux_site_funding,
+               acknowledgement AS ameriflux_acknowledgement,
+               acknowledgement_comment AS ameriflux_acknowledgement_comment,
+               doi_citation AS ameriflux_doi_citation,
+               alternate_url AS ameriflux_alternate_url
+        FROM flux_tower_attributes INNER JOIN _site_filter USING (site_id)
+        """,
+}
+
+# Request options sent to the API as their string representation, and the
+# function that converts each back to its Python type
+_STRING_CONVERTERS = {
+    "depth_level": int,
+    "latitude_range": lambda value: tuple(_parse_sequence(value)),
+    "longitude_range": lambda value: tuple(_parse_sequence(value)),
+    "site_ids": lambda value: _parse_sequence(value),
+    "site_networks": lambda value: _parse_sequence(value),
+    "min_num_obs": int,
+    "return_metadata": lambda value: value.strip().lower() in ("true", "1", "yes"),
+    "all_attributes": lambda value: value.strip().lower() in ("true", "1", "yes"),
+}
+_STRINGIFY_KEYS = frozenset(_STRING_CONVERTERS)
+
+# Shared HTTP session so PIN validation and data requests reuse keep-alive
+# connections (and TLS sessions) to the HydroData API. Connection failures and
+# transient gateway errors are retried with backoff; the final response is
+# returned rather than raised so callers report the status code as before.
+_SESSION = requests.Session()
+_HTTP_ADAPTER = requests.adapters.HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[502, 503, 504],
+        raise_on_status=False,
+    ),
+)
+# HYDRODATA_URL may point at a plain http:// server, e.g. a local deployment
+_SESSION.mount("https://", _HTTP_ADAPTER)
+_SESSION.mount("http://", _HTTP_ADAPTER)
+
+# Bytes read per iteration when buffering an API response body
+_API_CHUNK_SIZE = 1 << 20
+
+# Authorization headers from the last successful PIN validation, reused until
+# shortly before the JWT expires
+_CACHED_HEADERS = {"key": None, "value": None, "expires": None}
+_JWT_EXPIRY_MARGIN = datetime.timedelta(seconds=30)
+
+# Status codes from the data endpoint that mean the JWT was not accepted
+_JWT_REJECTED_CODES = frozenset({401, 403})
+
+# Email and pin parsed from ~/.hydrodata/pin.json, keyed by the file's path,
+# modification time and size
+_CACHED_PIN = {"key": None, "value": None}
+
+# Validated JWT shared between processes, stored next to the registered pin
+_JWT_CACHE_PATH = "~/.hydrodata/jwt_cache.json"
+
+# Per-thread cache of open database connections, keyed by database path
+_CONN_LOCAL = threading.local()
+
+# Seconds between checks of whether the database file has changed under a
+# cached connection; each check is a stat, which is a round trip on NFS
+_CONN_CHECK_INTERVAL = 60.0
+
+# Applied once when a connection is opened. The 256 MB memory map and 64 MB
+# page cache keep the hot site/observation index pages resident without
+# mapping the whole database file into the address space. The connection is
+# opened read-only, so only the in-memory TEMP schema can be written to.
+_CONN_PRAGMAS = """
+    PRAGMA mmap_size=268435456;
+    PRAGMA cache_size=-65536;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA busy_timeout=5000;
+"""
+
 
 def get_data(data_source, variable, temporal_resolution, aggregation, *args, **kwargs):
     """
@@ -76,6 +323,14 @@ def get_data(data_source, variable, temporal_resolution, aggregation, *args, **k
         in the package directory and named as 'network_name'.csv. Eg: `site_networks=['gagesii']`
     min_num_obs : int; default=1
         Value for the minimum number of observations desired for a site to have.
+    chunksize : int; default=None
+        If provided, return a generator that reads and yields the data for `chunksize`
+        sites at a time instead of a single DataFrame. Only supported when reading
+        from a local HydroData mount.
+    sites_df : DataFrame; default=None
+        Sites to read data for, e.g. as returned by `get_metadata` with the same filters.
+        Only the 'site_id' column is used. If provided, the site query is skipped. Only
+        supported when reading from a local HydroData mount.
 
     Returns
     -------
@@ -83,7 +338,8 @@ def get_data(data_source, variable, temporal_resolution, aggregation, *args, **k
         Stacked observations data for a single variable, filtered to only sites that
         (optionally) have the minimum number of observations specified, within the
         (optionally) have the minimum number of observations specified, within the
-        defined geographic and/or date range.
+        defined geographic and/or date range. If `chunksize` is provided, a generator
+        of such DataFrames, one per chunk of sites.
     """
 
     if len(args) > 0 and isinstance(args[0], dict):
@@ -91,9 +347,17 @@ def get_data(data_source, variable, temporal_resolution, aggregation, *args, **k
     else:
         options = kwargs
 
-    run_remote = not os.path.exists(HYDRODATA)
+    if "columns" in options:
+        raise ValueError("columns is not a supported filter option.")
+
+    run_remote = _run_remote()
 
     if run_remote:
+        if "chunksize" in options and options["chunksize"] is not None:
+            raise ValueError("chunksize is only supported when reading data from a local HydroData mount.")
+        if "sites_df" in options and options["sites_df"] is not None:
+            raise ValueError("sites_df is only supported when reading data from a local HydroData mount.")
+
         data_df = _get_data_from_api(
             "data_only",
             data_source,
@@ -107,8 +371,8 @@ def get_data(data_source, variable, temporal_resolution, aggregation, *args, **k
 
     kwargs = _convert_strings_to_type(options)
 
-    # Create database connection
-    conn = sqlite3.connect(DB_PATH)
+    # Get cached database connection
+    conn = _get_conn(DB_PATH)
 
     # Validation checks on inputs
     _check_inputs(
@@ -117,29 +381,43 @@ def get_data(data_source, variable, temporal_resolution, aggregation, *args, **k
 
     # Get associated variable IDs for requested data types and time periods
     var_id = _get_var_id(
-        conn, data_source, variable, temporal_resolution, aggregation, *args, **kwargs
+        DB_PATH, data_source, variable, temporal_resolution, aggregation, *args, **kwargs
     )
 
-    # Get site list
-    sites_df = _get_sites(
-        conn, data_source, variable, temporal_resolution, aggregation, *args, **kwargs
-    )
+    # Get site list; only the site IDs are needed to read the data. Sites already
+    # returned by get_metadata can be passed in to skip the query.
+    sites_df = options.get("sites_df")
+    if sites_df is None:
+        sites_df = _get_sites(
+            conn, data_source, variable, temporal_resolution, aggregation, *args,
+            columns=["s.site_id"], **kwargs
+        )
+
+    # The record_count prefilter on min_num_obs is a superset check; if it leaves
+    # no sites, read the sites without it so that _filter_min_num_obs decides
+    # the result exactly as it would have without the prefilter
+    if len(sites_df) == 0 and options.get("sites_df") is None and kwargs.get("min_num_obs") is not None:
+        sites_df = _get_sites(
+            conn, data_source, variable, temporal_resolution, aggregation,
+            columns=["s.site_id"], **dict(kwargs, min_num_obs=None)
+        )
 
     if len(sites_df) == 0:
         raise ValueError("There are zero sites that satisfy the given parameters.")
 
     # Get data
-    site_list = list(sites_df["site_id"])
-
-    if (var_id in (1, 2, 3, 4)) | (var_id in range(6, 25)):
-        data_df = _get_data_nc(site_list, var_id, *args, **kwargs)
+    site_list = sites_df["site_id"].to_numpy()
 
-    elif var_id == 5:
-        data_df = _get_data_sql(conn, var_id, *args, **kwargs)
+    if "chunksize" in options and options["chunksize"] is not None:
+        return _iter_data_chunks(
+            conn, site_list, var_id, options["chunksize"], *args, **kwargs
+        )
 
-    conn.close()
+    data_df = _read_site_data(conn, site_list, var_id, *args, **kwargs)
+    if data_df is None:
+        raise ValueError("There are zero sites that satisfy the given parameters.")
 
-    return data_df.reset_index().drop("index", axis=1)
+    return data_df
 
 
 def get_metadata(data_source, variable, temporal_resolution, aggregation, *args, **kwargs):
@@ -180,6 +458,11 @@ def get_metadata(data_source, variable, temporal_resolution, aggregation, *args,
         'YYYY-MM-DD' date indicating beginning of time range.
     date_end : str; default=None
         'YYYY-MM-DD' date indicating end of time range.
+    min_num_obs : int; default=None
+        Only return sites whose overall record count is at least this value. The
+        count is over the site's whole record, not only the dates between
+        `date_start` and `date_end`, so the result can include sites that
+        `get_data` with the same `min_num_obs` leaves out.
     latitude_range : tuple; default=None
         Latitude range bounds for the geographic domain; lesser value is provided first.
     longitude_range : tuple; default=None
@@ -205,7 +488,10 @@ def get_metadata(data_source, variable, temporal_resolution, aggregation, *args,
     else:
         options = kwargs
 
-    run_remote = not os.path.exists(HYDRODATA)
+    if "columns" in options:
+        raise ValueError("columns is not a supported filter option.")
+
+    run_remote = _run_remote()
 
     if run_remote:
         data_df = _get_data_from_api(
@@ -221,90 +507,28 @@ def get_metadata(data_source, variable, temporal_resolution, aggregation, *args,
 
     options = _convert_strings_to_type(options)
 
-    # Create database connection
-    conn = sqlite3.connect(DB_PATH)
+    # Get cached database connection
+    conn = _get_conn(DB_PATH)
 
     metadata_df = _get_sites(
         conn, data_source, variable, temporal_resolution, aggregation, *args, **kwargs
     )
 
     # Clean up HUC to string of appropriate length
-    metadata_df["huc8"] = metadata_df["huc"].apply(lambda x: _clean_huc(x))
+    metadata_df["huc8"] = _clean_huc(metadata_df["huc"])
     metadata_df.drop(columns=["huc"], inplace=True)
 
     # Merge on additional metadata attribute tables as needed
-    site_ids = list(metadata_df["site_id"])
-
-    if "stream gauge" in metadata_df["site_type"].unique():
-        attributes_df = pd.read_sql_query(
-            """SELECT site_id, conus1_x, conus1_y, conus2_x, conus2_y,
-                      gages_drainage_sqkm AS gagesii_drainage_area,
-                      class AS gagesii_class,
-                      site_elevation_meters AS gagesii_site_elevation,
-                      drain_area_va AS usgs_drainage_area
-               FROM streamgauge_attributes WHERE site_id IN (%s)"""
-            % ",".join("?" * len(site_ids)),
-            conn,
-            params=site_ids,
-        )
-        metadata_df = pd.merge(metadata_df, attributes_df, how="left", on="site_id")
-
-    if "groundwater well" in metadata_df["site_type"].unique():
-        attributes_df = pd.read_sql_query(
-            """SELECT site_id, conus1_x, conus1_y, conus2_x, conus2_y,
-                      nat_aqfr_cd AS usgs_nat_aqfr_cd,
-                      aqfr_cd AS usgs_aqfr_cd,
-                      aqfr_type_cd AS usgs_aqfr_type_cd,
-                      well_depth_va AS usgs_well_depth,
-                      hole_depth_va AS usgs_hole_depth,
-                      depth_src_cd AS usgs_hole_depth_src_cd
-               FROM well_attributes WHERE site_id IN (%s)"""
-            % ",".join("?" * len(site_ids)),
-            conn,
-            params=site_ids,
-        )
-        metadata_df = pd.merge(metadata_df, attributes_df, how="left", on="site_id")
-
-    if ('SNOTEL station' in metadata_df['site_type'].unique()) or ('SCAN station' in metadata_df['site_type'].unique()):
-        attributes_df = pd.read_sql_query(
-            """SELECT site_id, conus1_x, conus1_y, conus2_x, conus2_y,
-                      elevation AS usda_elevation
-               FROM snotel_station_attributes WHERE site_id IN (%s)"""
-            % ",".join("?" * len(site_ids)),
-            conn,
-            params=site_ids,
-        )
-        metadata_df = pd.merge(metadata_df, attributes_df, how="left", on="site_id")
-
-    if "flux tower" in metadata_df["site_type"].unique():
-        attributes_df = pd.read_sql_query(
-            """SELECT site_id, conus1_x, conus1_y, conus2_x, conus2_y,
-                      site_description AS ameriflux_site_description,
-                      elevation AS ameriflux_elevation,
-                      tower_type AS ameriflux_tower_type,
-                      igbp AS ameriflux_igbp,
-                      terrain AS ameriflux_terrain,
-                      site_snow_cover_days AS ameriflux_site_snow_cover_days,
-                      climate_koeppen AS ameriflux_climate_koeppen,
-                      mean_annual_temp AS ameriflux_mean_annual_temp,
-                      mean_annual_precip AS ameriflux_mean_annual_precip,
-                      team_member_name AS ameriflux_team_member_name,
-                      team_member_role AS ameriflux_team_member_role,
-                      team_member_email AS ameriflux_team_member_email,
-                      team_member_institution AS ameriflux_team_member_institution,
-                      site_funding AS ameriflux_site_funding,
-                      acknowledgement AS ameriflux_acknowledgement,
-                      acknowledgement_comment AS ameriflux_acknowledgement_comment,
-                      doi_citation AS ameriflux_doi_citation,
-                      alternate_url AS ameriflux_alternate_url
-               FROM flux_tower_attributes WHERE site_id IN (%s)"""
-            % ",".join("?" * len(site_ids)),
-            conn,
-            params=site_ids,
-        )
-        metadata_df = pd.merge(metadata_df, attributes_df, how="left", on="site_id")
+    _set_site_filter(conn, metadata_df["site_id"])
+
+    site_types = set(metadata_df["site_type"].unique())
+    tables = {_SITE_TYPE_ATTRIBUTES[t] for t in site_types if t in _SITE_TYPE_ATTRIBUTES}
+
+    for table, query in _ATTRIBUTE_QUERIES.items():
+        if table in tables:
+            attributes_df = _query_df(conn, query)
+            metadata_df = pd.merge(metadata_df, attributes_df, how="left", on="site_id")
 
-    conn.close()
     return metadata_df
 
 
@@ -321,30 +545,59 @@ def _get_data_from_api(
 
     try:
         headers = _validate_user()
-        response = requests.get(point_data_url, headers=headers, timeout=180)
-        if response.status_code != 200:
-            raise ValueError(
-                f"The  {point_data_url} returned error code {response.status_code} with message {response.content}."
-            )
-
-    except requests.exceptions.Timeout as e:
+        response = _SESSION.get(point_data_url, headers=headers, timeout=180, stream=True)
+        if response.status_code in _JWT_REJECTED_CODES:
+            # The cached JWT may have been revoked; forget it and validate the
+            # email/pin again once
+            response.close()
+            _clear_jwt_cache(headers)
+            headers = _validate_user()
+            response = _SESSION.get(point_data_url, headers=headers, timeout=180, stream=True)
+        # Read the body through iter_content so that read timeouts and dropped
+        # connections surface as requests exceptions, and unpickle from a
+        # seekable buffer
+        with response:
+            if response.status_code != 200:
+                raise ValueError(
+                    f"The  {point_data_url} returned error code {response.status_code} with message {response.content}."
+                )
+            buffer = io.BytesIO()
+            for chunk in response.iter_content(chunk_size=_API_CHUNK_SIZE):
+                buffer.write(chunk)
+        buffer.seek(0)
+        data_df = pd.read_pickle(buffer)
+
+    except (requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError) as e:
         raise ValueError(f"The point_data_url {point_data_url} has timed out.") from e
+    except requests.exceptions.ConnectionError as e:
+        # requests reports a read timeout while streaming the body as a
+        # ConnectionError wrapping urllib3's ReadTimeoutError
+        if e.args and isinstance(e.args[0], urllib3.exceptions.ReadTimeoutError):
+            raise ValueError(f"The point_data_url {point_data_url} has timed out.") from e
+        raise ValueError(f"Could not connect to {HYDRODATA_URL}.") from e
 
-    data_df = pd.read_pickle(io.BytesIO(response.content))
     return data_df
 
 
 def _validate_user():
     email, pin = get_registered_api_pin()
+    cache_key = hashlib.sha256(f"{HYDRODATA_URL}\n{email}\n{pin}".encode("utf-8")).hexdigest()
+    if not _cached_headers_valid(cache_key):
+        # Another process may already have validated this email/pin
+        _read_jwt_cache(cache_key)
+    if _cached_headers_valid(cache_key):
+        return dict(_CACHED_HEADERS["value"])
+
     url_security = f"{HYDRODATA_URL}/api/api_pins?pin={pin}&email={email}"
-    response = requests.get(url_security, headers=None, timeout=15)
+    response = _SESSION.get(url_security, headers=None, timeout=15)
     if not response.status_code == 200:
         raise ValueError(
-            f"The  {url_security} returned error code {response.status_code} with message {response.content}. User may need register their email and pin. See documentation to register with a URL."
+            f"The  {url_security} returned error code {response.status_code} with message {response.content}.  The email '{email}' may not be registered. See documentation to register with an email and pin."
         )
     json_string = response.content.decode("utf-8")
     jwt_json = json.loads(json_string)
     expires_string = jwt_json.get("expires")
+    expires = None
     if expires_string:
         expires = datetime.datetime.strptime(
             expires_string, "%Y/%m/%d %H:%M:%S GMT-0000"
@@ -357,9 +610,115 @@ def _validate_user():
     jwt_token = jwt_json["jwt_token"]
     headers = {}
     headers["Authorization"] = f"Bearer {jwt_token}"
+
+    # Only tokens with a known expiry are reused
+    _CACHED_HEADERS.update(key=cache_key, value=dict(headers), expires=expires)
+    if expires is not None:
+        _write_jwt_cache(cache_key, jwt_token, expires_string)
     return headers
 
 
+def _utcnow():
+    """Return the current UTC time as a naive datetime, matching the JWT expiry."""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _cached_headers_valid(cache_key):
+    """Check whether the in-memory headers belong to `cache_key` and have not expired."""
+    return (
+        _CACHED_HEADERS["key"] == cache_key
+        and _CACHED_HEADERS["expires"] is not None
+        and _utcnow() < _CACHED_HEADERS["expires"] - _JWT_EXPIRY_MARGIN
+    )
+
+
+def _read_jwt_cache(cache_key):
+    """
+    Load a JWT saved by a previous process into the in-memory header cache.
+
+    The cache file is best-effort: a missing, unreadable or mismatched file is
+    ignored and the caller falls back to validating the email/pin.
+
+    Parameters
+    ----------
+    cache_key : str
+        Hash of the API URL, email and pin the token must have been issued for.
+    """
+    cache_path = os.path.expanduser(_JWT_CACHE_PATH)
+    try:
+        with open(cache_path, "r") as stream:
+            cached = json.load(stream)
+        if cached.get("key") != cache_key:
+            return
+        expires = datetime.datetime.strptime(
+            cached["expires"], "%Y/%m/%d %H:%M:%S GMT-0000"
+        )
+        headers = {"Authorization": f"Bearer {cached['jwt_token']}"}
+    except (OSError, ValueError, KeyError, TypeError):
+        return
+    _CACHED_HEADERS.update(key=cache_key, value=headers, expires=expires)
+
+
+def _write_jwt_cache(cache_key, jwt_token, expires_string):
+    """
+    Save a JWT so other processes using the same email/pin can reuse it.
+
+    The token is written to a temporary file that is only readable by the current
+    user and then renamed over the cache, so readers never see a partial file and
+    an existing cache with looser permissions is replaced.
+
+    Parameters
+    ----------
+    cache_key : str
+        Hash of the API URL, email and pin the token was issued for.
+    jwt_token : str
+        Token returned by the API.
+    expires_string : str
+        Token expiry as returned by the API.
+    """
+    cache_path = os.path.expanduser(_JWT_CACHE_PATH)
+    contents = {"key": cache_key, "jwt_token": jwt_token, "expires": expires_string}
+    temp_path = None
+    try:
+        # mkstemp creates the file with mode 0600
+        fd, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(cache_path), prefix=".jwt_cache.", suffix=".tmp"
+        )
+        with os.fdopen(fd, "w") as stream:
+            json.dump(contents, stream)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        if temp_path is not None:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+
+def _clear_jwt_cache(headers):
+    """
+    Forget a JWT that the API rejected.
+
+    The in-memory headers are always reset. The cache file is only removed if it
+    still holds the rejected token, so a token another process has since saved
+    is kept.
+
+    Parameters
+    ----------
+    headers : dict
+        Authorization headers that were rejected.
+    """
+    _CACHED_HEADERS.update(key=None, value=None, expires=None)
+    cache_path = os.path.expanduser(_JWT_CACHE_PATH)
+    try:
+        with open(cache_path, "r") as stream:
+            cached = json.load(stream)
+        if headers.get("Authorization") == f"Bearer {cached['jwt_token']}":
+            os.remove(cache_path)
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+
 def get_registered_api_pin() -> Tuple[str, str]:
     """
     Get the email and pin registered by the current user.
@@ -372,16 +731,25 @@ def get_registered_api_pin() -> Tuple[str, str]:
 
     pin_dir = os.path.expanduser("~/.hydrodata")
     pin_path = f"{pin_dir}/pin.json"
-    if not os.path.exists(pin_path):
+    try:
+        pin_stat = os.stat(pin_path)
+    except OSError:
         raise ValueError(
             "No email/pin was registered. Use the register_api() method to register the pin you created at the website."
         )
+
+    # Only re-read the file if it has changed since it was last parsed
+    cache_key = (pin_path, pin_stat.st_mtime_ns, pin_stat.st_size)
+    if _CACHED_PIN["key"] == cache_key:
+        return _CACHED_PIN["value"]
+
     try:
         with open(pin_path, "r") as stream:
             contents = stream.read()
             parsed_contents = json.loads(contents)
             email = parsed_contents.get("email")
             pin = parsed_contents.get("pin")
+            _CACHED_PIN.update(key=cache_key, value=(email, pin))
             return (email, pin)
     except Exception as e:
         raise ValueError(
@@ -397,34 +765,64 @@ def _convert_params_to_string_dict(options):
     ----------
     options : dictionary
         request options.
+
+    Returns
+    -------
+    dictionary
+        New dictionary of request options with non-string values of the keys in
+        `_STRINGIFY_KEYS` converted to strings.
     """
+    return {
+        key: _stringify_value(value)
+        if key in _STRINGIFY_KEYS and not isinstance(value, str)
+        else value
+        for key, value in options.items()
+    }
 
-    for key, value in options.items():
-        if key == "depth_level":
-            if not isinstance(value, str):
-                options[key] = str(value)
-        if key == "latitude_range":
-            if not isinstance(value, str):
-                options[key] = str(value)
-        if key == "longitude_range":
-            if not isinstance(value, str):
-                options[key] = str(value)
-        if key == "site_ids":
-            if not isinstance(value, str):
-                options[key] = str(value)
-        if key == "min_num_obs":
-            if not isinstance(value, str):
-                options[key] = str(value)
-        if key == "site_networks":
-            if not isinstance(value, str):
-                options[key] = str(value)
-        # Don't need below anymore?  Check with Amy D.
-        """
-        if key == "all_attributes":
-            if not isinstance(value, str):
-                options[key] = str(value)
-        """
-    return options
+
+def _stringify_value(value):
+    """
+    Convert a single request option value to a string.
+
+    Parameters
+    ----------
+    value : any
+        Request option value. Lists, tuples and booleans are encoded as JSON,
+        all other values with `str`.
+
+    Returns
+    -------
+    str
+        String representation of `value`.
+    """
+    if isinstance(value, (list, tuple)):
+        return json.dumps(list(value))
+    if isinstance(value, bool):
+        return json.dumps(value)
+    return str(value)
+
+
+def _parse_sequence(value):
+    """
+    Parse a list or tuple sent as a request option string.
+
+    Values are sent as JSON; the Python literal form produced by older clients
+    (e.g. "['01019000', '01027200']") is still accepted.
+
+    Parameters
+    ----------
+    value : str
+        String representation of a list or tuple.
+
+    Returns
+    -------
+    list or tuple
+        The parsed sequence.
+    """
+    try:
+        return json.loads(value)
+    except ValueError:
+        return ast.literal_eval(value)
 
 
 def _convert_strings_to_type(options):
@@ -438,30 +836,8 @@ def _convert_strings_to_type(options):
     """
 
     for key, value in options.items():
-        if key == "depth_level":
-            if isinstance(value, str):
-                options[key] = int(value)
-        if key == "latitude_range":
-            if isinstance(value, str):
-                options[key] = ast.literal_eval(value)
-        if key == "longitude_range":
-            if isinstance(value, str):
-                options[key] = ast.literal_eval(value)
-        if key == "site_ids":
-            if isinstance(value, str):
-                options[key] = ast.literal_eval(value)
-        if key == "site_networks":
-            if isinstance(value, str):
-                options[key] = ast.literal_eval(value)
-        if key == "min_num_obs":
-            if isinstance(value, str):
-                options[key] = int(value)
-        # Don't need below anymore?  Check with Amy D.
-        """
-        if key == "all_attributes":
-            if isinstance(value, str):
-                options[key] = bool(value)
-        """
+        if key in _STRING_CONVERTERS and isinstance(value, str):
+            options[key] = _STRING_CONVERTERS[key](value)
 
     return options
 
@@ -474,32 +850,41 @@ def _construct_string_from_qparams(
 
     Parameters
     ----------
-    entry : hydroframe.data_catalog.data_model_access.ModelTableRow
-        variable to be downloaded.
+    data_type : str
+        Type of request: 'data_only' or 'metadata_only'.
+    data_source : str
+        Source from which requested data originated.
+    variable : str
+        Description of type of data requested.
+    temporal_resolution : str
+        Collection frequency of data requested.
+    aggregation : str
+        Aggregation method for the variable requested.
     options : dictionary
-        datast to which the variable belongs.
+        request options. The dictionary is not modified.
 
     Returns
     -------
-    data : numpy array
-        the requested data.
+    result_string : str
+        URL-encoded query string.
     """
 
-    qparam_values = options
-    qparam_values["data_type"] = data_type
-    qparam_values["data_source"] = data_source
-    qparam_values["variable"] = variable
-    qparam_values["temporal_resolution"] = temporal_resolution
-    qparam_values["aggregation"] = aggregation
-
-    string_parts = [
-        f"{name}={value}" for name, value in options.items() if value is not None
-    ]
-    result_string = "&".join(string_parts)
+    qparam_values = {
+        **options,
+        "data_type": data_type,
+        "data_source": data_source,
+        "variable": variable,
+        "temporal_resolution": temporal_resolution,
+        "aggregation": aggregation,
+    }
+
+    result_string = urllib.parse.urlencode(
+        {name: value for name, value in qparam_values.items() if value is not None}
+    )
     return result_string
 
 
-def get_citations(data_source, variable, temporal_resolution, aggregation, site_ids=None):
+def get_citations(data_source, variable, temporal_resolution, aggregation, site_ids=None, silent=False):
     """
     Print and/or return specific citation information.
 
@@ -527,148 +912,176 @@ def get_citations(data_source, variable, temporal_resolution, aggregation, site_
     site_ids : list; default None
         If provided, the specific list of sites to return data DOIs for. This is only
         supported if `data_source` == 'ameriflux'.
+    silent : bool; default False
+        If True, do not print the citation statement.
 
     Returns
     -------
     None or DataFrame of site-specific DOIs
         Nothing returned unless data_source == `ameriflux` and the parameter `site_ids` is provided.
     """
-    try:
-        assert data_source in ["usgs_nwis", "usda_nrcs", "ameriflux"]
-    except:
+    if not _is_allowed(data_source, _DATA_SOURCES):
         raise ValueError(
             f"Unexpected value of data_source, {data_source}. Supported values include 'usgs_nwis', 'usda_nrcs', and 'ameriflux'"
         )
 
-    if data_source == "usgs_nwis":
-        print(
-            """Most U.S. Geological Survey (USGS) information resides in Public Domain 
-              and may be used without restriction, though they do ask that proper credit be given.
-              An example credit statement would be: "(Product or data name) courtesy of the U.S. Geological Survey"
-              Source: https://www.usgs.gov/information-policies-and-instructions/acknowledging-or-crediting-usgs"""
-        )
+    if not silent:
+        print(_CITATIONS[data_source])
 
-    elif data_source == "usda_nrcs":
-        print(
-            """Most information presented on the USDA Web site is considered public domain information. 
-                Public domain information may be freely distributed or copied, but use of appropriate
-                byline/photo/image credits is requested. 
-                Attribution may be cited as follows: "U.S. Department of Agriculture"
-                Source: https://www.usda.gov/policies-and-links"""
-        )
-
-    elif data_source == "ameriflux":
-        print(
-            """All AmeriFlux sites provided by the HydroData service follow the CC-BY-4.0 License.
-                The CC-BY-4.0 license specifies that the data user is free to Share (copy and redistribute 
-                the material in any medium or format) and/or Adapt (remix, transform, and build upon the 
-                material) for any purpose.
-            
-                Users of this data must acknowledge the AmeriFlux data resource with the following statement:
-                "Funding for the AmeriFlux data portal was provided by the U.S. Department of Energy Office 
-                of Science."
-            
-                Additionally, for each AmeriFlux site used, you must provide a citation to the site's 
-                data product that includes the data product DOI. The DOI for each site is included in the 
-                full metadata query. Alternately, a site list can be provided to this get_citation_information
-                function to return each site-specific DOI.
-            
-                Source: https://ameriflux.lbl.gov/data/data-policy/"""
-        )
+    if data_source == "ameriflux":
+        # Site-specific DOIs are only looked up when sites are requested
+        if site_ids is None:
+            return None
 
-        if site_ids is not None:
+        if _run_remote():
             metadata_df = get_metadata(data_source, variable, temporal_resolution, aggregation, site_ids=site_ids)
-        return metadata_df[['site_id', 'doi']]
+            return metadata_df[['site_id', 'doi']]
 
+        # Only the DOIs are needed, so skip the attribute table lookups in get_metadata
+        conn = _get_conn(DB_PATH)
+        return _get_sites(conn, data_source, variable, temporal_resolution, aggregation,
+                          site_ids=site_ids, columns=["s.site_id", "s.doi"])
 
-def _convert_params_to_string_dict(options):
+
+def _run_remote():
     """
-    Converts types other than strings to strings.
+    Check whether requests should be sent to the HydroData API.
+
+    Requests are served remotely when the HydroData directory is not mounted,
+    or when the HF_FORCE_REMOTE environment variable is set to a true value.
+
+    Returns
+    -------
+    bool
+        True if requests should go to the API rather than the local files.
+    """
+    if os.getenv("HF_FORCE_REMOTE", "").strip().lower() in ("1", "true", "yes"):
+        return True
+    return not _path_exists(HYDRODATA)
+
+
+@functools.lru_cache(maxsize=None)
+def _path_exists(path):
+    """Cached os.path.exists; the HydroData mount does not come and go within a process."""
+    return os.path.exists(path)
+
+
+def _get_conn(db_path):
+    """
+    Return a cached read-only connection to the SQLite database.
+
+    Connections are opened once per thread and reused on subsequent calls, so
+    repeated queries avoid re-opening the database file and re-reading its schema.
+    The database is updated in place by the data pipeline, so it is opened
+    read-only but not immutable. At most every _CONN_CHECK_INTERVAL seconds the
+    file is checked for changes; if it has changed, a new connection is opened
+    and the cached var_id lookups are cleared. Set the HF_SQL_TRACE environment
+    variable to a true value to print each SQL statement executed.
 
     Parameters
     ----------
-    options : dictionary
-        request options.
+    db_path : str
+        Path to the SQLite database file.
+
+    Returns
+    -------
+    conn : Connection object
+        Read-only Connection object associated with the SQLite database.
     """
+    connections = getattr(_CONN_LOCAL, "connections", None)
+    if connections is None:
+        connections = _CONN_LOCAL.connections = {}
+
+    now = time.monotonic()
+    cached = connections.get(db_path)
+    if cached is not None:
+        conn, signature, checked_at = cached
+        if now - checked_at < _CONN_CHECK_INTERVAL:
+            return conn
+        if _db_signature(db_path) == signature:
+            connections[db_path] = (conn, signature, now)
+            return conn
+        # A chunk generator may still be reading from the old connection, so it
+        # is dropped rather than closed; it closes once no longer referenced
+        del connections[db_path]
+        _lookup_var_id.cache_clear()
+
+    signature = _db_signature(db_path)
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conn.executescript(_CONN_PRAGMAS)
+    if os.getenv("HF_SQL_TRACE", "").strip().lower() in ("1", "true", "yes"):
+        conn.set_trace_callback(print)
+    connections[db_path] = (conn, signature, now)
+
+    return conn
+
+
+def _db_signature(db_path):
+    """Identify the current version of the database file by its inode, modification time and size."""
+    stat = os.stat(db_path)
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _set_site_filter(conn, site_ids):
+    """
+    Load site IDs into the connection's temporary `_site_filter` table.
 
-    for key, value in options.items():
-        if key == "depth_level":
-            if not isinstance(value, str):
-                options[key] = str(value)
-        if key == "latitude_range":
-            if not isinstance(value, str):
-                options[key] = str(value)
-        if key == "longitude_range":
-            if not isinstance(value, str):
-                options[key] = str(value)
-        if key == "site_ids":
-            if not isinstance(value, str):
-                options[key] = str(value)
-        if key == "min_num_obs":
-            if not isinstance(value, str):
-                options[key] = str(value)
-        if key == "return_metadata":
-            if not isinstance(value, str):
-                options[key] = str(value)
-        if key == "all_attributes":
-            if not isinstance(value, str):
-                options[key] = str(value)
-    return options
+    Queries can then JOIN against `_site_filter` instead of expanding one
+    placeholder per site into an `IN (...)` list, which keeps the SQL text
+    constant regardless of the number of sites.
 
+    Parameters
+    ----------
+    conn : Connection object
+        The Connection object associated with the SQLite database to
+        query from.
+    site_ids : iterable of str
+        Site identifiers to load into the filter table.
 
-def _validate_user():
-    email, pin = get_registered_api_pin()
-    url_security = f"{HYDRODATA_URL}/api/api_pins?pin={pin}&email={email}"
-    response = requests.get(url_security, headers=None, timeout=15)
-    if not response.status_code == 200:
-        raise ValueError(
-            f"The  {url_security} returned error code {response.status_code} with message {response.content}.  The email '{email}' may not be registered. See documentation to register with an email and pin."
-        )
-    json_string = response.content.decode("utf-8")
-    jwt_json = json.loads(json_string)
-    expires_string = jwt_json.get("expires")
-    if expires_string:
-        expires = datetime.datetime.strptime(
-            expires_string, "%Y/%m/%d %H:%M:%S GMT-0000"
-        )
-        now = datetime.datetime.now()
-        if now > expires:
-            raise ValueError(
-                "PIN has expired. Please re-register it from https://hydrogen.princeton.edu/pin"
-            )
-    jwt_token = jwt_json["jwt_token"]
-    headers = {}
-    headers["Authorization"] = f"Bearer {jwt_token}"
-    return headers
+    Returns
+    -------
+    None
+    """
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _site_filter(site_id TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM _site_filter")
+    conn.executemany("INSERT OR IGNORE INTO _site_filter VALUES (?)", ((s,) for s in site_ids))
+    conn.commit()
 
 
-def get_registered_api_pin() -> Tuple[str, str]:
+def _query_df(conn, query, params=()):
     """
-    Get the email and pin registered by the current user.
+    Run a query and return the result as a DataFrame.
 
-    Returns:
-        A tuple (email, pin)
-    Raises:
-        ValueError if no email/pin was registered
+    A lighter-weight alternative to `pd.read_sql_query` for the small metadata
+    queries: rows are fetched from the cursor and passed straight to the
+    DataFrame constructor.
+
+    Parameters
+    ----------
+    conn : Connection object
+        The Connection object associated with the SQLite database to
+        query from.
+    query : str
+        SQL query to run.
+    params : sequence; default ()
+        Parameters bound to the query placeholders.
+
+    Returns
+    -------
+    DataFrame
+        Query result with one column per selected expression.
     """
+    cursor = conn.execute(query, params)
+    columns = [c[0] for c in cursor.description]
+    return pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
 
-    pin_dir = os.path.expanduser("~/.hydrodata")
-    pin_path = f"{pin_dir}/pin.json"
-    if not os.path.exists(pin_path):
-        raise ValueError(
-            "No email/pin was registered. Use the register_api() method to register the pin you created at the website."
-        )
+
+def _is_allowed(value, allowed):
+    """Test membership in a set of allowed values, treating unhashable values as not allowed."""
     try:
-        with open(pin_path, "r") as stream:
-            contents = stream.read()
-            parsed_contents = json.loads(contents)
-            email = parsed_contents.get("email")
-            pin = parsed_contents.get("pin")
-            return (email, pin)
-    except Exception as e:
-        raise ValueError(
-            "No email/pin was registered. Use the register_api() method to register the pin you created at the website."
-        ) from e
+        return value in allowed
+    except TypeError:
+        return False
 
 
 def _check_inputs(data_source, variable, temporal_resolution, aggregation, *args, **kwargs):
@@ -709,50 +1122,42 @@ def _check_inputs(data_source, variable, temporal_resolution, aggregation, *args
     else:
         options = kwargs
 
-    try:
-        assert temporal_resolution in ['daily', 'hourly', 'instantaneous']
-    except:
+    if not _is_allowed(temporal_resolution, _TEMPORAL_RESOLUTIONS):
         raise ValueError(
             f"Unexpected value for temporal_resolution, {temporal_resolution}. Please see the documentation for allowed values.")
 
-    try:
-        assert variable in ['streamflow', 'wtd', 'swe', 'precipitation', 'temperature', 'soil moisture',
-                            'latent heat flux', 'sensible heat flux', 'shortwave radiation', 'longwave radiation',
-                            'vapor pressure deficit', 'wind speed']
-    except:
+    if not _is_allowed(variable, _VARIABLES):
         raise ValueError(f"Unexpected value for variable, {variable}. Please see the documentation for allowed values.")
 
-    try:
-        assert aggregation in ['average', 'instantaneous', 'total', 'total, snow-adjusted',
-                               'start-of-day', 'accumulated', 'minimum', 'maximum']
-    except:
+    if not _is_allowed(aggregation, _AGGREGATIONS):
         raise ValueError(
             f"Unexpected value for aggregation, {aggregation}. Please see the documentation for allowed values.")
 
-    try:
-        assert data_source in ['usgs_nwis', 'usda_nrcs', 'ameriflux']
-    except:
+    if not _is_allowed(data_source, _DATA_SOURCES):
         raise ValueError(
             f"Unexpected value for data_source, {data_source} Please see the documentation for allowed values.")
 
-    if variable == 'soil moisture':
-        try:
-            assert 'depth_level' in options
-            assert options['depth_level'] in [2, 4, 8, 20, 40]
-        except:
-            raise ValueError(
-                "Please provide depth_level with one of the supported values. Please see the documentation for allowed values.")
+    if variable == 'soil moisture' and not _is_allowed(options.get('depth_level'), _DEPTH_LEVELS):
+        raise ValueError(
+            "Please provide depth_level with one of the supported values. Please see the documentation for allowed values.")
 
+    chunksize = options.get('chunksize')
+    if chunksize is not None and (isinstance(chunksize, bool) or not isinstance(chunksize, int) or chunksize <= 0):
+        raise ValueError("Please provide chunksize as a positive integer number of sites.")
 
-def _get_var_id(conn, data_source, variable, temporal_resolution, aggregation, *args, **kwargs):
+    sites_df = options.get('sites_df')
+    if sites_df is not None and (not isinstance(sites_df, pd.DataFrame) or 'site_id' not in sites_df.columns):
+        raise ValueError("Please provide sites_df as a DataFrame with a 'site_id' column.")
+
+
+def _get_var_id(db_path, data_source, variable, temporal_resolution, aggregation, *args, **kwargs):
     """
     Return mapped var_id.
 
     Parameters
     ----------
-    conn : Connection object
-        The Connection object associated with the SQLite database to 
-        query from. 
+    db_path : str
+        Path to the SQLite database to query from.
     data_source : str
         Source from which requested data originated. Currently supported: 'usgs_nwis', 'usda_nrcs', 
         'ameriflux'.    
@@ -787,36 +1192,43 @@ def _get_var_id(conn, data_source, variable, temporal_resolution, aggregation, *
     else:
         options = kwargs
 
-    if variable == 'soil moisture':
-        query = """
-                SELECT var_id 
-                FROM variables
-                WHERE data_source = ?
-                    AND variable = ?
-                    AND temporal_resolution = ?
-                    AND aggregation = ?
-                    AND depth_level = ?
-                """
-        param_list = [data_source, variable, temporal_resolution, aggregation, options['depth_level']]
+    depth_level = options['depth_level'] if variable == 'soil moisture' else None
 
-    else:
-        query = """
-                SELECT var_id 
-                FROM variables
-                WHERE data_source = ?
-                    AND variable = ?
-                    AND temporal_resolution = ?
-                    AND aggregation = ?
-                """
-        param_list = [data_source, variable, temporal_resolution, aggregation]
+    return _lookup_var_id(db_path, data_source, variable, temporal_resolution, aggregation, depth_level)
 
-    try:
-        result = pd.read_sql_query(query, conn, params=param_list)
-        return int(result['var_id'][0])
-    except:
+
+@functools.lru_cache(maxsize=256)
+def _lookup_var_id(db_path, data_source, variable, temporal_resolution, aggregation, depth_level=None):
+    """
+    Look up a var_id in the `variables` table, memoized per database path.
+
+    Each combination is only queried once. The cache is keyed on the path rather
+    than the connection so that it does not keep connections alive, and _get_conn
+    clears it when the database file has changed. Unsupported combinations raise
+    and are not cached.
+    """
+    conn = _get_conn(db_path)
+    query = """
+            SELECT var_id 
+            FROM variables
+            WHERE data_source = ?
+                AND variable = ?
+                AND temporal_resolution = ?
+                AND aggregation = ?
+            """
+    param_list = [data_source, variable, temporal_resolution, aggregation]
+
+    if variable == 'soil moisture':
+        query += "    AND depth_level = ?\n"
+        param_list.append(depth_level)
+
+    row = conn.execute(query, param_list).fetchone()
+    if row is None:
         raise ValueError(
             'The provided combination of data_source, variable, temporal_resolution, and aggregation is not currently supported.')
 
+    return int(row[0])
+
 
 def _get_dirpath(var_id):
     """
@@ -833,35 +1245,10 @@ def _get_dirpath(var_id):
     dirpath : str
         Directory path for observation data location.
     """
-    dirpath_map = {1: '/hydrodata/national_obs/streamflow/data/hourly',
-                   2: '/hydrodata/national_obs/streamflow/data/daily',
-                   3: '/hydrodata/national_obs/groundwater/data/hourly',
-                   4: '/hydrodata/national_obs/groundwater/data/daily',
-                   5: '',
-                   6: '/hydrodata/national_obs/swe/data/daily',
-                   7: '/hydrodata/national_obs/point_meteorology/NRCS_precipitation/data/daily',
-                   8: '/hydrodata/national_obs/point_meteorology/NRCS_precipitation/data/daily',
-                   9: '/hydrodata/national_obs/point_meteorology/NRCS_precipitation/data/daily',
-                   10: '/hydrodata/national_obs/point_meteorology/NRCS_temperature/data/daily',
-                   11: '/hydrodata/national_obs/point_meteorology/NRCS_temperature/data/daily',
-                   12: '/hydrodata/national_obs/point_meteorology/NRCS_temperature/data/daily',
-                   13: '/hydrodata/national_obs/soil_moisture/data/daily',
-                   14: '/hydrodata/national_obs/soil_moisture/data/daily',
-                   15: '/hydrodata/national_obs/soil_moisture/data/daily',
-                   16: '/hydrodata/national_obs/soil_moisture/data/daily',
-                   17: '/hydrodata/national_obs/soil_moisture/data/daily',
-                   18: '/hydrodata/national_obs/ameriflux/data/hourly',
-                   19: '/hydrodata/national_obs/ameriflux/data/hourly',
-                   20: '/hydrodata/national_obs/ameriflux/data/hourly',
-                   21: '/hydrodata/national_obs/ameriflux/data/hourly',
-                   22: '/hydrodata/national_obs/ameriflux/data/hourly',
-                   23: '/hydrodata/national_obs/ameriflux/data/hourly',
-                   24: '/hydrodata/national_obs/ameriflux/data/hourly'}
-
-    return dirpath_map[var_id]
-
-
-def _get_sites(conn, data_source, variable, temporal_resolution, aggregation, *args, **kwargs):
+    return _DIRPATHS[var_id]
+
+
+def _get_sites(conn, data_source, variable, temporal_resolution, aggregation, *args, columns=None, **kwargs):
     """
     Build DataFrame with site attribute metadata information.
 
@@ -886,6 +1273,9 @@ def _get_sites(conn, data_source, variable, temporal_resolution, aggregation, *a
         for allowable combinations with `variable`.
     args :
         Optional positional parameters that must be a dict with filter options.
+    columns : list; default=None
+        Column expressions to select. By default all site attribute metadata
+        columns are returned.
     kwargs :
         Supports multiple named parameters with filter option values.
 
@@ -897,6 +1287,8 @@ def _get_sites(conn, data_source, variable, temporal_resolution, aggregation, *a
         'YYYY-MM-DD' date indicating beginning of time range.
     date_end : str; default=None
         'YYYY-MM-DD' date indicating end of time range.
+    min_num_obs : int; default=None
+        Only return sites whose overall record count is at least this value.
     latitude_range : tuple; default=None
         Latitude range bounds for the geographic domain; lesser value is provided first.
     longitude_range : tuple; default=None
@@ -929,80 +1321,58 @@ def _get_sites(conn, data_source, variable, temporal_resolution, aggregation, *a
         options = kwargs
 
     # Get associated variable IDs for requested data types and time periods
-    var_id = _get_var_id(conn, data_source, variable, temporal_resolution, aggregation, *args, **kwargs)
+    var_id = _get_var_id(DB_PATH, data_source, variable, temporal_resolution, aggregation, *args, **kwargs)
 
     param_list = [var_id]
 
-    # Date start
-    if 'date_start' in options and options['date_start'] is not None:
-        date_start_query = """ AND last_date_data_available >= ?"""
-        param_list.append(options['date_start'])
-    else:
-        date_start_query = """"""
-
-    # Date end
-    if 'date_end' in options and options['date_end'] is not None:
-        date_end_query = """ AND first_date_data_available <= ?"""
-        param_list.append(options['date_end'])
-    else:
-        date_end_query = """"""
-
-    # Latitude
-    if 'latitude_range' in options and options['latitude_range'] is not None:
-        lat_query = """ AND latitude BETWEEN ? AND ?"""
-        param_list.append(options['latitude_range'][0])
-        param_list.append(options['latitude_range'][1])
-    else:
-        lat_query = """"""
-
-    # Longitude
-    if 'longitude_range' in options and options['longitude_range'] is not None:
-        lon_query = """ AND longitude BETWEEN ? AND ?"""
-        param_list.append(options['longitude_range'][0])
-        param_list.append(options['longitude_range'][1])
-    else:
-        lon_query = """"""
-
-    # Site ID
-    if 'site_ids' in options and options['site_ids'] is not None:
-        site_query = """ AND s.site_id IN (%s)""" % ','.join('?'*len(options['site_ids']))
-        for s in options['site_ids']:
-            param_list.append(s)
-    else:
-        site_query = """"""
-
-    # State
-    if 'state' in options and options['state'] is not None:
-        state_query = """ AND state == ?"""
-        param_list.append(options['state'])
-    else:
-        state_query = """"""
+    filter_query = """"""
+    for option, clause, to_params in _SITE_FILTERS:
+        if option in options and options[option] is not None:
+            filter_query += clause
+            param_list.extend(to_params(options[option]))
 
     # Site Networks
     if 'site_networks' in options and options['site_networks'] is not None:
         network_site_list = _get_network_site_list(data_source, variable, options['site_networks'])
-        network_query = """ AND s.site_id IN (%s)""" % ','.join('?'*len(network_site_list))
-        for s in network_site_list:
-            param_list.append(s)
-    else:
-        network_query = """"""
+        filter_query += """ AND s.site_id IN (SELECT value FROM json_each(?))"""
+        param_list.append(_json_site_list(network_site_list))
+
+    if columns is None:
+        columns = _SITE_COLUMNS
 
     query = """
-            SELECT s.site_id, s.site_name, s.site_type, s.agency, s.state,
-                   s.latitude, s.longitude, s.huc, o.first_date_data_available,
-                   o.last_date_data_available, o.record_count, s.site_query_url,
-                   s.date_metadata_last_updated, s.tz_cd, s.doi
+            SELECT """ + ", ".join(columns) + """
             FROM sites s
             INNER JOIN observations o
             ON s.site_id = o.site_id AND o.var_id == ?
             WHERE first_date_data_available <> 'None'
-            """ + date_start_query + date_end_query + lat_query + lon_query + site_query + state_query + network_query
+            """ + filter_query
 
-    df = pd.read_sql_query(query, conn, params=param_list)
+    df = _query_df(conn, query, param_list)
 
     return df
 
 
+def _json_site_list(site_ids):
+    """
+    Encode site IDs as a JSON array for binding to a json_each() parameter.
+
+    Duplicates are dropped and the IDs sorted, so the site_id index is probed
+    once per site in key order.
+
+    Parameters
+    ----------
+    site_ids : iterable
+        Site identifiers.
+
+    Returns
+    -------
+    str
+        JSON array of the unique site identifiers as strings, sorted.
+    """
+    return json.dumps(sorted({str(site_id) for site_id in site_ids}))
+
+
 def _get_network_site_list(data_source, variable, site_networks):
     """
     Return list of site IDs for desired network of observation sites.
@@ -1027,26 +1397,37 @@ def _get_network_site_list(data_source, variable, site_networks):
     site_list: list
         List of site ID strings for sites belonging to named network.
     """
-    network_options = {'usgs_nwis': {'streamflow': ['camels', 'gagesii_reference', 'gagesii', 'hcdn2009'],
-                                     'wtd': ['climate_response_network']}}
-
     # Initialize final site list
     site_list = []
 
     # Append sites from desired network(s)
     for network in site_networks:
+        error_message = (
+            f'Network option {network} is not recognized. Please make sure the .csv network_lists/{data_source}/{variable}/{network}.csv exists.')
+        if network not in _NETWORK_OPTIONS.get(data_source, {}).get(variable, []):
+            raise ValueError(error_message)
         try:
-            assert network in network_options[data_source][variable]
-            df = pd.read_csv(f'{NETWORK_LISTS_PATH}/{data_source}/{variable}/{network}.csv',
-                             dtype=str, header=None, names=['site_id'])
-            site_list += list(df['site_id'])
-        except:
-            raise ValueError(
-                f'Network option {network} is not recognized. Please make sure the .csv network_lists/{data_source}/{variable}/{network}.csv exists.')
+            site_list += _read_network_csv(data_source, variable, network)
+        except FileNotFoundError:
+            raise ValueError(error_message)
 
     # Make sure only list of unique site IDs is returned (in case multiple, overlapping networks provided)
-    # Note: calling 'set' can change the order of the IDs, but for this workflow that does not matter
-    return list(set(site_list))
+    return list(dict.fromkeys(site_list))
+
+
+@functools.lru_cache(maxsize=64)
+def _read_network_csv(data_source, variable, network):
+    """
+    Read the site IDs of a single network list, cached for the life of the process.
+
+    Returns
+    -------
+    tuple
+        Site ID strings listed in the network's .csv file.
+    """
+    df = pd.read_csv(f'{NETWORK_LISTS_PATH}/{data_source}/{variable}/{network}.csv',
+                     dtype=str, header=None, names=['site_id'])
+    return tuple(df['site_id'])
 
 
 def _clean_huc(huc):
@@ -1055,59 +1436,61 @@ def _clean_huc(huc):
 
     Parameters
     ----------
-    huc : str
-        Single string value representing a HUC code.
+    huc : Series
+        String values representing HUC codes.
 
     Returns
     -------
-    cleaned_huc : str
-        HUC8 code or '' if not enough information available.
+    cleaned_huc : Series
+        HUC8 codes, or '' where not enough information is available.
     """
-    # Clean out HUC values that are fewer than 7 digits
-    huc_length = len(huc)
-    if huc_length < 7:
-        cleaned_huc = ''
+    huc_length = huc.str.len()
 
     # If 7 or 11 digits, add a leading 0
-    elif len(huc) in (7, 11):
-        huc = '0' + huc
-
-    # Truncate to HUC8 for 'least common denominator' level
-    if len(huc) >= 8:
-        cleaned_huc = huc[0:8]
+    huc = huc.where(~huc_length.isin([7, 11]), "0" + huc)
 
-    return cleaned_huc
+    # Truncate to HUC8 for 'least common denominator' level, and clean out HUC
+    # values that are fewer than 7 digits
+    return huc.str.slice(0, 8).where(huc_length >= 7, "")
 
 
-def _convert_to_pandas(ds):
+def _convert_to_pandas(site_data, site_list):
     """
-    Convert xarray DataSet to pandas DataFrame.
+    Assemble per-site observations into a wide pandas DataFrame.
+
+    The sites are aligned on the union of their dates and written into one
+    preallocated array, so no intermediate stacked copies are made.
 
     Parameters
     ----------
-    ds : DataSet
-        xarray DataSet containing stacked observations data for a 
-        single variable. 
-    var_id : int
-        Integer variable ID associated with combination of `variable`, `temporal_resolution`,
-        and `aggregation`.
+    site_data : list of DataArray
+        Observations for each site, indexed by a 'datetime' coordinate.
+    site_list : array-like
+        Site IDs, in the same order as `site_data`.
 
     Returns
     -------
     DataFrame
-        Stacked observations data for a single variable.
+        Stacked observations data for a single variable, with a 'date' column
+        followed by one column per site.
     """
-    sites = pd.Series(ds['site'].to_numpy())
-    dates = pd.Series(ds['date'].to_numpy()).astype(str)
-    data = ds.to_numpy()
+    indexes = [t.indexes['datetime'] for t in site_data]
+    dates = functools.reduce(pd.Index.union, indexes)
 
-    df = pd.DataFrame(data.T, columns=sites)
-    df['date'] = dates
+    # Sites missing some of the dates are filled with NaN, as an outer join would
+    dtype = np.result_type(*(t.dtype for t in site_data))
+    if dtype.kind not in 'fc' and any(len(index) != len(dates) for index in indexes):
+        dtype = np.result_type(dtype, np.float64)
 
-    # Reorder columns to put site_id first
-    cols = df.columns.tolist()
-    cols = cols[-1:] + cols[:-1]
-    df = df[cols]
+    # Sites usually share the same dates, in which case their values are copied
+    # straight into the column without looking up row positions
+    data = np.full((len(dates), len(site_data)), np.nan, dtype=dtype)
+    for col, (index, temp) in enumerate(zip(indexes, site_data)):
+        rows = slice(None) if index.equals(dates) else dates.get_indexer(index)
+        data[rows, col] = temp.values
+
+    df = pd.DataFrame(data, columns=pd.Series(site_list))
+    df.insert(0, 'date', pd.Series(dates).astype(str))
 
     return df
 
@@ -1133,22 +1516,85 @@ def _filter_min_num_obs(df, min_num_obs):
         Stacked observations data for a single variable, filtered to only sites that
         have the minimum number of observations specified.
     """
-    dfc = df.copy()
-
-    # drop columns with too many NaN values
-    df_filtered = dfc.dropna(thresh=min_num_obs, axis=1)
+    # drop columns with too many NaN values; dropna returns a new DataFrame
+    df_filtered = df.dropna(thresh=min_num_obs, axis=1)
 
     return df_filtered
 
 
+def _read_site_data(conn, site_list, var_id, *args, **kwargs):
+    """
+    Read observations data for a list of sites from the appropriate storage.
+
+    Parameters
+    ----------
+    conn : Connection object
+        The Connection object associated with the SQLite database to
+        query from.
+    site_list : array-like
+        Site IDs to query observations data for.
+    var_id : int
+        Integer variable ID associated with combination of `data_source`,
+        `variable`, `temporal_resolution`, and `aggregation`.
+    args :
+        Optional positional parameters that must be a dict with filter options.
+    kwargs :
+        Supports multiple named parameters with filter option values.
+
+    Returns
+    -------
+    DataFrame or None
+        Observations data for the requested sites, with a fresh RangeIndex. None
+        if none of the sites stored in NetCDF files has a data file.
+    """
+    if var_id in _NC_VAR_IDS:
+        return _get_data_nc(site_list, var_id, *args, **kwargs)
+
+    elif var_id == 5:
+        return _get_data_sql(conn, site_list, var_id, *args, **kwargs)
+
+
+def _iter_data_chunks(conn, site_list, var_id, chunk_size, *args, **kwargs):
+    """
+    Yield observations data for `chunk_size` sites at a time.
+
+    Parameters
+    ----------
+    conn : Connection object
+        The Connection object associated with the SQLite database to
+        query from.
+    site_list : array-like
+        Site IDs to query observations data for.
+    var_id : int
+        Integer variable ID associated with combination of `data_source`,
+        `variable`, `temporal_resolution`, and `aggregation`.
+    chunk_size : int
+        Number of sites to read per chunk.
+    args :
+        Optional positional parameters that must be a dict with filter options.
+    kwargs :
+        Supports multiple named parameters with filter option values.
+
+    Yields
+    ------
+    DataFrame
+        Observations data for the next chunk of sites. Chunks in which no site
+        has a data file are skipped.
+    """
+    for start in range(0, len(site_list), chunk_size):
+        chunk_df = _read_site_data(conn, site_list[start:start + chunk_size], var_id, *args, **kwargs)
+        if chunk_df is not None:
+            yield chunk_df
+
+
 def _get_data_nc(site_list, var_id, *args, **kwargs):
     """
     Get observations data for data that is stored in NetCDF files.
 
     Parameters
     ----------
-    site_list : list
-        List of site IDs to query observations data for.
+    site_list : array-like
+        Site IDs to query observations data for.
     var_id : int
         Integer variable ID associated with combination of `data_source`,
         `variable`, `temporal_resolution`, and `aggregation`.
@@ -1168,9 +1614,10 @@ def _get_data_nc(site_list, var_id, *args, **kwargs):
 
     Returns
     -------
-    DataFrame
+    DataFrame or None
         Stacked observations data for a single variable, filtered to only sites that
-        have the minimum number of observations specified.
+        have the minimum number of observations specified. None if none of the
+        sites has a data file.
     """
     if len(args) > 0 and isinstance(args[0], dict):
         options = args[0]
@@ -1180,66 +1627,94 @@ def _get_data_nc(site_list, var_id, *args, **kwargs):
     dirpath = _get_dirpath(var_id)
     file_list = [f'{dirpath}/{site}.nc' for site in site_list]
 
-    varname_map = {'1': 'streamflow', '2': 'streamflow', '3': 'wtd', '4': 'wtd', '5': 'wtd',
-                   '6': 'swe', '7': 'precip_acc', '8': 'precip_inc', '9': 'precip_inc_sa',
-                   '10': 'temp_min', '11': 'temp_max', '12': 'temp_avg',
-                   '13': 'sms_2in', '14': 'sms_4in', '15': 'sms_8in', '16': 'sms_20in', '17': 'sms_40in',
-                   '18': 'latent heat flux', '19': 'sensible heat flux', '20': 'shortwave radiation',
-                   '21': 'longwave radiation', '22': 'vapor pressure deficit', '23': 'air temperature',
-                   '24': 'wind speed'}
-
-    varname = varname_map[str(var_id)]
+    varname = _VARNAMES[var_id]
 
-    if 'date_start' in options:
-        date_start_dt = np.datetime64(options['date_start'])
-    if 'date_end' in options:
-        date_end_dt = np.datetime64(options['date_end'])
+    date_start_dt = np.datetime64(options['date_start']) if 'date_start' in options else None
+    date_end_dt = np.datetime64(options['date_end']) if 'date_end' in options else None
 
     print('collecting data...')
 
-    for i in range(len(site_list)):
-
-        # open single site file
-        temp = xr.open_dataset(file_list[i])[varname]
-
-        # make date variable name consistent
-        date_var = list(temp.coords)[0]
-        temp = temp.rename({date_var: 'datetime'})
-
-        # convert date string to datetime values
-        temp['datetime'] = pd.DatetimeIndex(temp['datetime'].values)
-
-        # subset to only observations within desired time range
-        if ('date_start' not in options) and ('date_end' not in options):
-            temp_wy = temp
-        elif ('date_start' not in options) and ('date_end' in options):
-            temp_wy = temp.sel(datetime=(temp.datetime <= date_end_dt))
-        elif ('date_start' in options) and ('date_end' not in options):
-            temp_wy = temp.sel(datetime=(temp.datetime >= date_start_dt))
-        elif ('date_start' in options) and ('date_end' in options):
-            temp_wy = temp.sel(datetime=(temp.datetime >= date_start_dt) & (temp.datetime <= date_end_dt))
-
-        if i == 0:
-            ds = temp_wy
-        else:
-            ds = xr.concat([ds, temp_wy], dim='site')
-
-    if len(site_list) == 1:
-        ds = ds.expand_dims(dim='site')
-
-    ds = ds.assign_coords({'site': (site_list)})
-    ds = ds.rename({'datetime': 'date'})
+    # Read each site's time range, then assemble all sites at once at the end
+    site_data = [_read_site_nc(file_path, varname, date_start_dt, date_end_dt) for file_path in file_list]
 
     print('data collected.')
 
-    data_df = _convert_to_pandas(ds)
+    # Sites listed in the database without a data file are reported and left
+    # out, rather than failing the whole request
+    missing = [site for site, temp in zip(site_list, site_data) if temp is None]
+    if missing:
+        warnings.warn(f"No data file found for site(s) {', '.join(map(str, missing))}; skipping.")
+        site_list = [site for site, temp in zip(site_list, site_data) if temp is not None]
+        site_data = [temp for temp in site_data if temp is not None]
+        if len(site_data) == 0:
+            return None
+
+    data_df = _convert_to_pandas(site_data, site_list)
     if 'min_num_obs' in options and options['min_num_obs'] is not None:
         return _filter_min_num_obs(data_df, options['min_num_obs'])
     else:
         return data_df
 
 
-def _get_data_sql(conn, var_id, *args, **kwargs):
+def _read_site_nc(file_path, varname, date_start=None, date_end=None):
+    """
+    Read one site's observations from its NetCDF file.
+
+    Only the requested variable is read, and only the values within the
+    date range are loaded from disk. The file is opened with cache=False as
+    the selection is loaded straight away, so xarray need not keep its own copy.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the site's NetCDF file.
+    varname : str
+        Name of the variable to read.
+    date_start : datetime64; default=None
+        Earliest date to include.
+    date_end : datetime64; default=None
+        Latest date to include.
+
+    Returns
+    -------
+    DataArray or None
+        Observations for the site indexed by a 'datetime' coordinate, or None
+        if the file does not exist.
+    """
+    try:
+        site_ds = xr.open_dataset(file_path, cache=False)
+    except FileNotFoundError:
+        return None
+
+    with site_ds:
+        temp = site_ds[varname]
+
+        # make date variable name consistent and convert date strings to datetime values
+        date_var = list(temp.coords)[0]
+        temp = temp.rename({date_var: 'datetime'})
+        if temp['datetime'].dtype.kind != 'M':
+            temp['datetime'] = pd.DatetimeIndex(temp['datetime'].values)
+
+        # subset to only observations within desired time range; site files are
+        # normally in date order, so the range is found by binary search
+        if date_start is not None or date_end is not None:
+            dates = temp.indexes['datetime']
+            if dates.is_monotonic_increasing:
+                start = dates.searchsorted(date_start, side='left') if date_start is not None else 0
+                end = dates.searchsorted(date_end, side='right') if date_end is not None else len(dates)
+                in_range = slice(start, end)
+            else:
+                in_range = np.ones(len(dates), dtype=bool)
+                if date_start is not None:
+                    in_range &= dates >= date_start
+                if date_end is not None:
+                    in_range &= dates <= date_end
+            temp = temp.isel(datetime=in_range)
+
+        return temp.load()
+
+
+def _get_data_sql(conn, site_list, var_id, *args, **kwargs):
     """
     Get observations data for data that is stored in a SQL table.
 
@@ -1248,6 +1723,8 @@ def _get_data_sql(conn, var_id, *args, **kwargs):
     conn : Connection object
         The Connection object associated with the SQLite database to 
         query from. 
+    site_list : array-like
+        Site IDs to query observations data for.
     var_id : int
         Integer variable ID associated with combination of `data_source`, 
         `variable`, `temporal_resolution`, and `aggregation`.
@@ -1287,33 +1764,32 @@ def _get_data_sql(conn, var_id, *args, **kwargs):
     else:
         min_num_obs = options['min_num_obs']
 
-    if ('date_start' not in options) and ('date_end' not in options):
-        date_query = """"""
-        param_list = [min_num_obs]
-    elif ('date_start' not in options) and ('date_end' in options):
-        date_query = """ WHERE w.date <= ?"""
-        param_list = [options['date_end'], min_num_obs, options['date_end']]
-    elif ('date_start' in options) and ('date_end' not in options):
-        date_query = """ WHERE w.date >= ?"""
-        param_list = [options['date_start'], min_num_obs, options['date_start']]
-    elif ('date_start' in options) and ('date_end' in options):
-        date_query = """ WHERE w.date >= ? AND w.date <= ?"""
-        param_list = [
-            options['date_start'],
-            options['date_end'],
-            min_num_obs, options['date_start'],
-            options['date_end']]
+    date_clauses = []
+    param_list = []
+    if 'date_start' in options:
+        date_clauses.append("w.date >= ?")
+        param_list.append(options['date_start'])
+    if 'date_end' in options:
+        date_clauses.append("w.date <= ?")
+        param_list.append(options['date_end'])
+    date_query = " WHERE " + " AND ".join(date_clauses) if date_clauses else ""
+    param_list.append(min_num_obs)
+
+    _set_site_filter(conn, site_list)
 
+    # Observations are counted per site with a window function, so the table
+    # is scanned once for both the count and the returned rows. Rows are
+    # returned in table order, as the window partitioning would regroup them.
     query = """
-            SELECT w.site_id, w.date, w.wtd, w.pumping_status
-            FROM wtd_discrete_data AS w
-            INNER JOIN (SELECT w.site_id, COUNT(*) AS num_obs
+            SELECT site_id, date, wtd, pumping_status
+            FROM (
+                SELECT w.rowid AS row_id, w.site_id, w.date, w.wtd, w.pumping_status,
+                    COUNT(*) OVER (PARTITION BY w.site_id) AS num_obs
                 FROM wtd_discrete_data AS w
-                """ + date_query + """
-                GROUP BY site_id
-                HAVING num_obs >= ?) AS c
-            ON w.site_id = c.site_id
-            """ + date_query
+                INNER JOIN _site_filter USING (site_id)""" + date_query + """)
+            WHERE num_obs >= ?
+            ORDER BY row_id
+            """
 
     df = pd.read_sql_query(query, conn, params=param_list)
 